@@ -9,16 +9,196 @@ import struct
 import json
 import time
 import os
+import sys
+import errno
+import ctypes
+import queue
+import zlib
+import contextlib
+import weakref
+import heapq
+import collections
+import functools
+import warnings
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import customtkinter as ctk
-from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk
-import cv2
+from tkinter import filedialog, messagebox, PhotoImage
+from PIL import Image, ImageDraw
 import numpy as np
-import sounddevice as sd
-import mss
 import base64
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import opuslib
+except Exception:  # package missing or libopus not found
+    opuslib = None
+
+# libjpeg-turbo's SIMD codec when installed; OpenCV's JPEG otherwise
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    turbo_jpeg = TurboJPEG()
+except Exception:  # package missing or the shared library not found
+    turbo_jpeg = None
+
+# Video tiles and the screen viewer paint into plain Tk PhotoImages sized in device pixels
+# (PPM put, no PIL round trip). CTkLabel accepts them but warns that
+# they won't be HiDPI-scaled, which is intended here
+warnings.filterwarnings('ignore', message=r'.*Given image is not CTkImage')
+
+# Length prefixes with this bit set carry a binary frame instead of JSON
+BINARY_FLAG = 0x80000000
+BIN_FILE_CHUNK = 1
+FILE_CHUNK_SIZE = 65536
+
+# Video frames are one datagram each: b"VIDEOFRAME:<user>:" + seq + JPEG bytes.
+# The 16-bit seq lets receivers drop frames that arrive late or reordered.
+VIDEO_HEADER = struct.Struct('>H')
+
+# Screen frames travel over UDP split into datagrams that fit a 1500-byte MTU:
+# b"SCREENFRAME:<user>:" + (seq, nchunks, idx) + up to SCREEN_CHUNK_SIZE JPEG bytes
+SCREEN_HEADER = struct.Struct('>HHH')
+SCREEN_CHUNK_SIZE = 1200
+
+# Linux UDP GSO: one sendmsg carries many equal-sized datagrams that the kernel splits.
+# At most 64 segments and 64 KB per call.
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+GSO_MAX_SEGMENTS = 64
+GSO_MAX_BYTES = 65000
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+# recvmmsg(2): reap up to UDP_BATCH datagrams per syscall on Linux (reached through libc,
+# the socket module has no wrapper). Other platforms read one datagram at a time.
+UDP_BATCH = 64
+UDP_MAX_DATAGRAM = 65536
+MSG_WAITFORONE = 0x10000
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+
+libc_recvmmsg = None
+if sys.platform.startswith('linux'):
+    try:
+        libc_recvmmsg = ctypes.CDLL(None, use_errno=True).recvmmsg
+        libc_recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        libc_recvmmsg.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        libc_recvmmsg = None
+
+# Webcam JPEG (size, quality) steps, best first, tried until a frame fits one datagram
+VIDEO_ENCODE_STEPS = tuple(
+    (size, q)
+    for size in ((320, 240), (288, 216), (256, 192))
+    for q in (60, 50, 40, 35, 30)
+)
+
+# Heavy media libraries are imported on first use so the login window opens
+# without paying for OpenCV/PortAudio/mss initialisation
+cv2 = None
+sd = None
+mss = None
+
+
+def import_cv2():
+    """Import OpenCV on first use"""
+    global cv2
+    if cv2 is None:
+        import cv2 as module
+        cv2 = module
+    return cv2
+
+
+def import_sounddevice():
+    """Import sounddevice (PortAudio) on first use"""
+    global sd
+    if sd is None:
+        import sounddevice as module
+        sd = module
+    return sd
+
+
+def import_mss():
+    """Import mss on first use"""
+    global mss
+    if mss is None:
+        import mss as module
+        mss = module
+    return mss
+
+
+def jpeg_encode(frame, quality):
+    """Encode a BGR frame to JPEG bytes, or None on failure"""
+    if turbo_jpeg:
+        return turbo_jpeg.encode(frame, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+    return buf.tobytes() if ok else None
+
+
+def jpeg_decode(data):
+    """Decode JPEG bytes (or a uint8 buffer) to a BGR frame, or None if corrupt"""
+    if turbo_jpeg:
+        try:
+            return turbo_jpeg.decode(data, pixel_format=TJPF_BGR)
+        except OSError:
+            return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def ppm_buffer(width, height):
+    """Binary PPM image (header written once) plus a (height, width, 3) view of its pixels.
+    
+    Filling the view with RGB and passing bytes(buffer) to PhotoImage.put() hands Tk
+    image data it decodes natively, with a single copy per frame.
+    """
+    header = b'P6\n%d %d\n255\n' % (width, height)
+    buf = bytearray(len(header) + width * height * 3)
+    buf[:len(header)] = header
+    return buf, np.frombuffer(buf, np.uint8, offset=len(header)).reshape(height, width, 3)
+
+
+def is_bgr8(frame):
+    """True for a 3-channel uint8 image: the only layout the RGB PPM buffers accept"""
+    # cv2 given a mismatched dst= silently allocates a new array and leaves the PPM stale
+    return frame is not None and frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] == 3
+
+
+def frame_digest(frame):
+    """Cheap fingerprint of a frame from every 4th pixel of every 4th row"""
+    sample = np.ascontiguousarray(frame[::4, ::4])
+    if xxhash:
+        return xxhash.xxh3_64_intdigest(sample)
+    return zlib.crc32(sample)
+
+
+# Unchanged frames are skipped, but still resent this often so late joiners and
+# receivers that lost a datagram catch up
+UNCHANGED_FRAME_RESEND = 1.0
+
+
 # Configure CustomTkinter
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -36,6 +216,7 @@ class IntraConnectClient:
         self.tcp_socket = None
         self.udp_socket = None
         self.connected = False
+        self.tcp_send_lock = threading.Lock()
         
         # Media state
         self.video_on = False
@@ -44,22 +225,90 @@ class IntraConnectClient:
         
         # Media capture
         self.video_cap = None
+        self.video_passthrough = False
+        self.video_encode_step = 0  # index into VIDEO_ENCODE_STEPS that fit the last frame
+        self.udp_gso = sys.platform.startswith('linux')  # cleared if the kernel rejects UDP_SEGMENT
         self.audio_stream = None
         self.audio_out_stream = None
-        self.sample_rate = 44100
+        # Received PCM blocks waiting for the output callback; drops the oldest past ~160 ms
+        self.audio_out_q = collections.deque(maxlen=8)
+        # 20 ms mono blocks at 48 kHz: the rate and frame size Opus works in natively
+        self.sample_rate = 48000
+        self.audio_block = 960
+        self.opus_encoder = None
+        self.opus_decoders = {}  # {username: opuslib.Decoder}; Opus streams are stateful
+        self.video_tx_seq = 0  # kept across camera restarts so peers never see it go backwards
+        self.video_rx_seq = {}  # {username: seq of the newest video frame accepted}
         self.screen_capturer = None
         
-        # Speaking detection
+        # Set by the capture threads as they exit; set while nothing is running
+        self.video_stopped = threading.Event()
+        self.video_stopped.set()
+        self.screen_stopped = threading.Event()
+        self.screen_stopped.set()
+        # Each share's stages watch their own stop event: after a quick stop/start,
+        # the old share's threads still see theirs set even though screen_on is True again
+        self.screen_stop = threading.Event()
+        self.screen_stop.set()
+        
+        # Speaking detection (Schmitt trigger with a minimum hold to avoid flapping)
         self.is_speaking = False
         self.speaking_threshold = 500
+        self.speaking_release_threshold = 300
+        self.speaking_hold = 0.4
+        self.speaking_until = 0.0
         
         # Video displays
         self.video_displays = []
         self.received_videos = {}
         self.username_to_slot = {}
+        # Remote tiles not yet given to anyone, as a min-heap so the lowest tile fills first
+        self.free_slots = list(range(1, 12))
+        self.slot_lock = threading.Lock()
+        
+        # Per-tile 320x240 buffers so resize/colour conversion never allocate
+        self.video_resize_bufs = [np.empty((240, 320, 3), np.uint8) for _ in range(12)]
+        self.video_ppm_bufs = [ppm_buffer(320, 240) for _ in range(12)]  # (ppm, rgb view)
+        
+        # Tile frames are decoded/resized on this pool; only the final repaint runs on Tk.
+        # A tile stays in decode_busy from submit until its repaint, which also keeps its
+        # buffers from being overwritten before Tk has read them. Frames arriving meanwhile
+        # park in decode_waiting, newest wins, and start as soon as the tile frees up.
+        self.decode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 4), thread_name_prefix="decode")
+        self.decode_lock = threading.Lock()
+        self.decode_busy = set()
+        self.decode_waiting = {}
+        
+        # TCP message type -> handler, so dispatch is one dict lookup
+        self.message_handlers = {
+            'USER_LIST': self.handle_user_list,
+            'CHAT': self.handle_chat,
+            'VIDEO_FRAME': self.handle_video_frame,
+            'FILE_INFO': self.handle_file_info,
+            'FILE_START': self.handle_file_start,
+            'SCREEN_START': self.handle_screen_start,
+            'SCREEN_STOP': self.handle_screen_stop,
+            'VIDEO_STOP': self.handle_video_stop,
+            'SPEAKING_STATUS': self.handle_speaking_status,
+        }
+        
+        # Pre-encoded control messages, built once the username is known
+        self.speaking_msgs = {}
+        self.video_stop_msg = None
         
         # File tracking
-        self.file_items = {}
+        # Shared-file model as parallel columns in arrival order; file_index maps name -> position
+        self.file_names = []
+        self.file_sizes = []
+        self.file_uploaders = []
+        self.file_index = {}
+        self.stale_file_rows = {}  # filenames whose row needs building/updating (ordered set)
+        # Rows are owned by files_list; destroying one drops it from here automatically
+        self.file_items = weakref.WeakValueDictionary()
+        self.user_rows = {}  # {username: row frame} in the users panel
+        self.download_icon = self.make_download_icon()  # shared by every file row's button
+        self.pending_file_rows = []
+        self.downloads = {}  # {filename: {'fd': int, 'path': str, 'remaining': int}}
         
         # Downloads folder
         self.downloads_folder = "downloads"
@@ -74,11 +323,34 @@ class IntraConnectClient:
         
         # UI state
         self.current_panel = "video"
+        self.window_mapped = True  # False while the main window is minimized
+        self.screen_popup_mapped = False  # True while the screen viewer is on screen
         self.panels = {}
         self.screen_popup = None
         self.screen_popup_label = None
+        self.screen_photo = None
+        self.screen_photo_shown = False
+        # Incoming screen frame being reassembled from UDP chunks; every share numbers
+        # its frames from 1 again, so this is reset per share and per presenter
+        self.screen_rx_user = None
+        self.screen_rx_seq = None
+        self.screen_rx_chunks = []
+        self.screen_rx_count = 0
+        # Newest screen frame (as PPM) not yet painted; drain_ui_queue picks it up each tick
+        self.pending_screen = None
+        
+        # Reusable screen frame buffers (800x600), filled in place on the receive thread
+        self.screen_bgr = np.empty((600, 800, 3), np.uint8)
+        self.screen_ppm, self.screen_rgb = ppm_buffer(800, 600)
         self.pending_users = None
         self.ui_ready = False
+        self.closing = False
+        self.pending_sends = []  # farewell frames flushed just before the TCP socket closes
+        
+        # Updates posted from network/media threads, run on the Tk thread by one poller
+        self.ui_queue = queue.SimpleQueue()
+        self.ui_last_busy = time.monotonic()  # last tick that found work; sets the poll rate
+        self.root.after(16, self.drain_ui_queue)
         
         self.setup_login_screen()
     
@@ -149,16 +421,42 @@ class IntraConnectClient:
             try:
                 # TCP
                 self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                # Room for a few 64 KB file chunks so uploads don't stall on every sendall
+                try:
+                    self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+                except OSError:
+                    pass
                 self.tcp_socket.connect((self.server_ip, 5555))
+                # Small control messages (SPEAKING_STATUS etc.) must not wait on Nagle
+                self.tcp_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 
                 # UDP
                 self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
                 self.udp_socket.bind(('0.0.0.0', 0))
+                self.tune_udp_socket(self.udp_socket)
                 udp_port = self.udp_socket.getsockname()[1]
                 
                 # Send connect message
                 msg = self.encode_message('CONNECT', {'username': self.username, 'udp_port': udp_port})
-                self.tcp_socket.sendall(msg)
+                self.send_tcp(msg)
+                
+                # Fixed-shape control messages only depend on the username, so encode them once
+                self.speaking_msgs = {
+                    speaking: self.encode_message('SPEAKING_STATUS', {'username': self.username, 'speaking': speaking})
+                    for speaking in (True, False)
+                }
+                self.video_stop_msg = self.encode_message('VIDEO_STOP', {'username': self.username})
+                # Same for the UDP packet headers
+                self.udp_dest = (self.server_ip, 5556)
+                self.video_prefix = f"VIDEOFRAME:{self.username}:".encode()
+                self.audio_prefix = f"AUDIOFRAME:{self.username}:".encode()
+                self.opus_prefix = f"AUDIOOPUS:{self.username}:".encode()
+                self.screen_prefix = f"SCREENFRAME:{self.username}:".encode()
+                
+                # Receivers decode frames and the main interface opens the speaker,
+                # so load those libraries here, off the Tk thread
+                import_cv2()
+                import_sounddevice()
                 
                 self.connected = True
                 
@@ -166,10 +464,10 @@ class IntraConnectClient:
                 threading.Thread(target=self.tcp_receiver, daemon=True).start()
                 threading.Thread(target=self.udp_receiver, daemon=True).start()
                 
-                self.root.after(0, self.setup_main_interface)
+                self.post_ui(self.setup_main_interface)
             except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Connection failed: {e}"))
-                self.root.after(0, lambda: self.connect_btn.configure(text="Connect", state="normal"))
+                self.post_ui(messagebox.showerror, "Error", f"Connection failed: {e}")
+                self.post_ui(self.connect_btn.configure, text="Connect", state="normal")
         
         threading.Thread(target=connect_thread, daemon=True).start()
     
@@ -290,6 +588,8 @@ class IntraConnectClient:
                 'frame': tile,
                 'label': label,
                 'name': name,
+                # One Tk photo per tile, repainted in place by apply_frame
+                'photo': PhotoImage(master=self.root, width=320, height=240),
                 'last_frame': None,
                 'video_active': False,
                 'speaking': False
@@ -319,6 +619,9 @@ class IntraConnectClient:
             wrap="word"
         )
         self.chat_box.pack(fill="both", expand=True, pady=(0, 5))
+        self.chat_box.tag_config("time", foreground="gray")
+        self.chat_box.tag_config("own", foreground="#00ff88")
+        self.chat_box.tag_config("other", foreground="white")
         
         chat_input = ctk.CTkFrame(chat_panel, fg_color="transparent")
         chat_input.pack(fill="x", pady=(0, 10))
@@ -330,7 +633,7 @@ class IntraConnectClient:
             placeholder_text="Type message..."
         )
         self.chat_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
-        self.chat_entry.bind("<Return>", lambda e: self.send_chat())
+        self.chat_entry.bind("<Return>", self.send_chat)
         
         ctk.CTkButton(
             chat_input,
@@ -393,7 +696,7 @@ class IntraConnectClient:
                 height=60,
                 font=("Arial", 20, "bold"),
                 fg_color="#2a2a2a",
-                command=lambda p=panel: self.switch_panel(p) if panel else cmd()
+                command=functools.partial(self.switch_panel, panel) if panel else cmd
             )
         
         sidebar_btn(sidebar_buttons_frame, "🎥", panel="video").pack(padx=5, pady=5)
@@ -404,6 +707,10 @@ class IntraConnectClient:
         
         self.switch_panel("video")
         
+        # Nothing decodes for tiles nobody can see; track minimize/restore of the main window
+        self.root.bind("<Map>", self.on_window_map, add="+")
+        self.root.bind("<Unmap>", self.on_window_map, add="+")
+        
         self.add_chat_msg("System", "Connected to IntraConnect server!", "#00ff88")
         
         self.ui_ready = True
@@ -422,7 +729,8 @@ class IntraConnectClient:
                 samplerate=self.sample_rate,
                 channels=1,
                 dtype='int16',
-                blocksize=1024
+                blocksize=self.audio_block,
+                callback=self.audio_out_callback
             )
             self.audio_out_stream.start()
         except Exception as e:
@@ -488,6 +796,7 @@ class IntraConnectClient:
                     # Validate by grabbing one frame
                     ret, frame = cap.read()
                     if ret and frame is not None:
+                        self.video_passthrough = self.enable_mjpeg_passthrough(cap)
                         return cap
                     cap.release()
                 except:
@@ -498,27 +807,48 @@ class IntraConnectClient:
         
         return None
     
+    def enable_mjpeg_passthrough(self, cap):
+        """Ask the backend for the camera's raw MJPG buffers instead of decoded BGR frames.
+        
+        Returns True if frames now arrive as JPEG bytes; otherwise restores BGR conversion.
+        """
+        try:
+            if cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+                ret, raw = cap.read()
+                if ret and raw is not None and raw.dtype == np.uint8 and raw.ndim <= 2 and raw.size > 2:
+                    head = raw.reshape(-1)[:2]
+                    if head[0] == 0xFF and head[1] == 0xD8:
+                        return True
+            cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        except:
+            pass
+        return False
+    
     def encode_frame_for_udp(self, frame, target_max=60000):
-        """Encode frame as JPEG with size under target_max bytes by scaling/quality reduction."""
+        """Encode frame as JPEG with size under target_max bytes by scaling/quality reduction.
+        
+        Consecutive frames compress alike, so the search starts from the (size, quality)
+        step that fit last time and only probes one step better when there is headroom.
+        """
         try:
             h, w = frame.shape[:2]
+            resized = {}
             
-            # Start with small size to avoid fragmentation
-            target_sizes = [(320, 240), (288, 216), (256, 192)]
-            qualities = [60, 50, 40, 35, 30]
-            
-            for (tw, th) in target_sizes:
-                resized = cv2.resize(frame, (tw, th)) if (w, h) != (tw, th) else frame
-                for q in qualities:
-                    ok, buf = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, q])
-                    if ok:
-                        data = buf.tobytes()
-                        if len(data) <= target_max:
-                            return data
+            start = self.video_encode_step
+            for step in range(start, len(VIDEO_ENCODE_STEPS)):
+                (tw, th), q = VIDEO_ENCODE_STEPS[step]
+                if (tw, th) not in resized:
+                    resized[(tw, th)] = cv2.resize(frame, (tw, th)) if (w, h) != (tw, th) else frame
+                data = jpeg_encode(resized[(tw, th)], q)
+                if data and len(data) <= target_max:
+                    if step == start and step > 0 and len(data) < target_max * 0.6:
+                        step -= 1  # plenty of room: try one step better next frame
+                    self.video_encode_step = step
+                    return data
             
             # Fallback: return smallest we produced even if larger
-            ok, buf = cv2.imencode('.jpg', cv2.resize(frame, (256, 192)), [cv2.IMWRITE_JPEG_QUALITY, 30])
-            return buf.tobytes() if ok else None
+            self.video_encode_step = len(VIDEO_ENCODE_STEPS) - 1
+            return jpeg_encode(cv2.resize(frame, (256, 192)), 30)
         except:
             return None
     
@@ -538,30 +868,123 @@ class IntraConnectClient:
             
             self.video_cap = cap
             self.video_on = True
-            threading.Thread(target=self.video_loop, daemon=True).start()
+            self.video_stopped.clear()
+            
+            # capture -> encode -> send, each on its own thread so the camera never waits on the encoder
+            encode_q = queue.Queue(maxsize=2)
+            send_q = queue.Queue(maxsize=2)
+            threading.Thread(target=self.video_capture_loop, args=(cap, encode_q, send_q), daemon=True).start()
+            threading.Thread(target=self.video_encode_loop, args=(encode_q, send_q), daemon=True).start()
+            threading.Thread(target=self.video_send_loop, args=(send_q,), daemon=True).start()
             return True
         except Exception as e:
             messagebox.showerror("Error", f"Video start failed: {e}")
             return False
     
-    def video_loop(self):
-        """Video streaming loop"""
-        while self.video_on:
-            ret, frame = self.video_cap.read()
-            if ret:
-                # Encode to safe UDP-sized JPEG (~60KB)
-                compressed = self.encode_frame_for_udp(frame)
-                if compressed:
-                    packet = f"VIDEOFRAME:{self.username}:".encode() + compressed
-                    try:
-                        self.udp_socket.sendto(packet, (self.server_ip, 5556))
-                    except:
-                        pass
+    def pace(self, next_tick, period):
+        """Sleep until the next frame deadline and return it; after an overrun restart from now"""
+        next_tick += period
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return next_tick
+        return time.monotonic()
+    
+    def put_latest(self, q, item):
+        """Queue item, dropping the oldest entry if the consumer is behind"""
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                pass
+    
+    def video_capture_loop(self, cap, encode_q, send_q):
+        """Video capture stage: read camera frames into a small pool of reusable buffers"""
+        # Enough buffers for the one being captured, two queued and one being encoded
+        pool = []
+        index = 0
+        last_preview = None  # digest of the frame last sent to the preview tile
+        next_tick = time.monotonic()
+        try:
+            while self.video_on:
+                try:
+                    if self.video_passthrough:
+                        # Camera already produced a JPEG: forward it as-is and decode only for preview
+                        ret, raw = cap.read()
+                        frame = jpeg_decode(raw.reshape(-1)) if ret else None
+                        ret = frame is not None
+                        if ret:
+                            jpeg = raw.tobytes()
+                            if len(jpeg) <= 60000:
+                                self.put_latest(send_q, jpeg)
+                            else:
+                                self.put_latest(encode_q, frame)
+                    else:
+                        if pool:
+                            ret, frame = cap.read(pool[index])
+                            index = (index + 1) % len(pool)
+                        else:
+                            ret, frame = cap.read()
+                            if ret:
+                                pool = [np.empty_like(frame) for _ in range(4)]
+                        if ret:
+                            self.put_latest(encode_q, frame)
+                except:
+                    break
+                
+                if ret and self.window_mapped and self.current_panel == 'video':
+                    # Display own video, unless the picture is the one already on the tile
+                    digest = frame_digest(frame)
+                    if digest != last_preview:
+                        last_preview = digest
+                        # The pool buffer is recycled by cap.read() while the preview may
+                        # still be waiting to decode, so hand over a tile-sized copy instead
+                        preview = cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA)
+                        self.submit_frame(0, frame=preview)
                 
-                # Display own video
-                self.update_video(0, frame)
+                next_tick = self.pace(next_tick, 1.0 / 15)
+        finally:
+            self.video_stopped.set()
+    
+    def video_encode_loop(self, encode_q, send_q):
+        """Video encode stage"""
+        last_digest, last_sent = None, 0.0
+        while self.video_on:
+            try:
+                frame = encode_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            # Still camera: don't re-encode and re-send the same picture
+            digest, now = frame_digest(frame), time.monotonic()
+            if digest == last_digest and now - last_sent < UNCHANGED_FRAME_RESEND:
+                continue
+            last_digest, last_sent = digest, now
+            
+            # Encode to safe UDP-sized JPEG (~60KB)
+            compressed = self.encode_frame_for_udp(frame)
+            if compressed:
+                self.put_latest(send_q, compressed)
+    
+    def video_send_loop(self, send_q):
+        """Video send stage"""
+        while self.video_on:
+            try:
+                compressed = send_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
             
-            time.sleep(1.0 / 15)
+            self.video_tx_seq = (self.video_tx_seq + 1) & 0xFFFF
+            try:
+                self.send_udp(self.video_prefix, VIDEO_HEADER.pack(self.video_tx_seq), compressed)
+            except:
+                pass
     
     def stop_video(self):
         """Stop video"""
@@ -571,14 +994,14 @@ class IntraConnectClient:
             self.video_cap = None
         
         # Notify server
-        msg = self.encode_message('VIDEO_STOP', {'username': self.username})
         try:
-            self.tcp_socket.sendall(msg)
+            self.send_tcp(self.video_stop_msg)
         except:
             pass
         
         # Clear own tile
         try:
+            self.video_displays[0]['video_active'] = False
             if self.blank_ctk_i:
                 self.video_displays[0]['label'].configure(text="📷 Off", image=self.blank_ctk_i)
         except:
@@ -589,14 +1012,23 @@ class IntraConnectClient:
     def start_audio(self):
         """Start audio"""
         try:
-            # Input stream (microphone)
-            self.audio_stream = sd.InputStream(
-                samplerate=self.sample_rate,
-                channels=1,
-                dtype='int16',
-                blocksize=1024,
-                callback=self.audio_callback
-            )
+            # Input stream (microphone) is opened once and only started/stopped on toggle,
+            # since opening a PortAudio stream re-queries the device and stalls the UI
+            if self.audio_stream is None:
+                if opuslib:
+                    try:
+                        self.opus_encoder = opuslib.Encoder(self.sample_rate, 1, 'voip')
+                        self.opus_encoder.bitrate = 24000
+                    except Exception as e:
+                        print(f"Opus unavailable, sending raw PCM: {e}")
+                        self.opus_encoder = None
+                self.audio_stream = sd.InputStream(
+                    samplerate=self.sample_rate,
+                    channels=1,
+                    dtype='int16',
+                    blocksize=self.audio_block,
+                    callback=self.audio_callback
+                )
             self.audio_stream.start()
             self.audio_on = True
             return True
@@ -605,7 +1037,7 @@ class IntraConnectClient:
             messagebox.showerror("Error", f"Audio start failed: {e}")
             return False
     
-    def audio_callback(self, indata, frames, time, status):
+    def audio_callback(self, indata, frames, time_info, status):
         """Callback for audio input - FIXED JSON serialization"""
         if not self.audio_on:
             return
@@ -615,50 +1047,63 @@ class IntraConnectClient:
             audio_data = indata.tobytes()
             
             # Speaking detection
-            rms = np.sqrt(np.mean(np.square(indata))) * 1000  # Calculate RMS in millivolts
-            current_speaking = rms > self.speaking_threshold
+            # RMS in int16 sample units; squaring int16 in place would overflow, and a
+            # float32 dot product runs the sum of squares through SIMD BLAS
+            samples = indata.astype(np.float32).ravel()
+            rms = float(np.sqrt(np.dot(samples, samples) / max(samples.size, 1)))
+            
+            # Rise above speaking_threshold, stay on until below the release threshold
+            # for speaking_hold seconds, so bursty speech toggles at most a few times a second
+            now = time.monotonic()
+            threshold = self.speaking_release_threshold if self.is_speaking else self.speaking_threshold
+            if rms > threshold:
+                self.speaking_until = now + self.speaking_hold
+            current_speaking = now < self.speaking_until
             
-            # FIXED: Convert numpy bool_ to Python bool
-            if bool(current_speaking) != self.is_speaking:
-                self.is_speaking = bool(current_speaking)  # FIXED: Convert to Python bool
-                msg = self.encode_message('SPEAKING_STATUS', {
-                    'username': self.username,
-                    'speaking': self.is_speaking  # Now using Python bool
-                })
+            if current_speaking != self.is_speaking:
+                self.is_speaking = current_speaking
                 try:
-                    self.tcp_socket.sendall(msg)
+                    self.send_tcp(self.speaking_msgs[self.is_speaking])
                 except:
                     pass
             
-            # Send audio via UDP
-            packet = f"AUDIOFRAME:{self.username}:".encode() + audio_data
+            # Send audio via UDP: ~60 byte Opus packets when possible, raw PCM otherwise
             try:
-                self.udp_socket.sendto(packet, (self.server_ip, 5556))
+                if self.opus_encoder:
+                    self.send_udp(self.opus_prefix, self.opus_encoder.encode(audio_data, frames))
+                else:
+                    self.send_udp(self.audio_prefix, audio_data)
             except:
                 pass
         except Exception as e:
             print(f"Audio callback error: {e}")
     
+    def audio_out_callback(self, outdata, frames, time_info, status):
+        """Play the oldest received block; silence when nothing has arrived"""
+        try:
+            block = self.audio_out_q.popleft()
+        except IndexError:
+            outdata.fill(0)
+            return
+        n = min(len(block), frames)
+        outdata[:n, 0] = block[:n]
+        outdata[n:] = 0
+    
     def stop_audio(self):
         """Stop audio"""
         self.audio_on = False
         
         # Clear speaking status
-        if hasattr(self, 'is_speaking') and self.is_speaking:
-            msg = self.encode_message('SPEAKING_STATUS', {
-                'username': self.username,
-                'speaking': False
-            })
+        if self.is_speaking:
             try:
-                self.tcp_socket.sendall(msg)
+                self.send_tcp(self.speaking_msgs[False])
             except:
                 pass
             self.is_speaking = False
         
         try:
-            if hasattr(self, 'audio_stream') and self.audio_stream:
+            if self.audio_stream:
                 self.audio_stream.stop()
-                self.audio_stream.close()
         except Exception as e:
             print(f"Error stopping audio: {e}")
     
@@ -667,51 +1112,159 @@ class IntraConnectClient:
     def start_screen(self):
         """Start screen share"""
         try:
-            self.screen_capturer = mss.mss()
+            import_mss()
+            previous = self.screen_stopped
+            stop, stopped = threading.Event(), threading.Event()
+            self.screen_stop, self.screen_stopped = stop, stopped
             self.screen_on = True
             msg = self.encode_message('SCREEN_START', {})
-            self.tcp_socket.sendall(msg)
-            threading.Thread(target=self.screen_loop, daemon=True).start()
+            self.send_tcp(msg)
+            
+            # Capture and encode on separate threads so grabbing never waits on the JPEG encoder
+            encode_q = queue.Queue(maxsize=1)
+            threading.Thread(target=self.screen_loop, args=(encode_q, stop, stopped, previous),
+                             daemon=True).start()
+            threading.Thread(target=self.screen_encode_loop, args=(encode_q, stop), daemon=True).start()
             return True
         except Exception as e:
             messagebox.showerror("Error", f"Screen share failed: {e}")
             return False
     
-    def screen_loop(self):
-        """Screen sharing loop"""
-        while self.screen_on:
+    def screen_loop(self, encode_q, stop, stopped, previous):
+        """Screen capture stage"""
+        try:
+            # DXcam hands out one camera per output, so let the last share release it first
+            previous.wait(1.0)
+            if sys.platform == 'win32' and self.dxcam_capture(encode_q, stop):
+                return
+            self.mss_capture(encode_q, stop)
+        finally:
+            stopped.set()
+    
+    def dxcam_capture(self, encode_q, stop):
+        """Capture through DXGI desktop duplication (DXcam); returns False if unavailable"""
+        try:
+            import dxcam
+            camera = dxcam.create(output_color='BGRA')
+            camera.start(target_fps=10, video_mode=True)
+        except Exception:
+            return False
+        
+        self.screen_capturer = camera
+        try:
+            while not stop.is_set():
+                # Blocks until DXcam's own 10 fps timer delivers the next frame;
+                # frames live in its 64-deep ring, so no copy is needed
+                frame = camera.get_latest_frame()
+                if frame is not None:
+                    self.put_latest(encode_q, frame)
+        except:
+            pass
+        finally:
+            self.screen_capturer = None
             try:
-                with mss.mss() as sct:
-                    monitor = sct.monitors[0]
+                camera.stop()
+                camera.release()
+            except:
+                pass
+        return True
+    
+    def mss_capture(self, encode_q, stop):
+        """Capture through mss"""
+        # One capture context for the whole share: mss sets up its GDI/XShm handles per
+        # instance and is not thread-safe, so it is created, used and closed on this thread
+        sct = None
+        try:
+            sct = mss.mss()
+            self.screen_capturer = sct
+            monitor = sct.monitors[0]
+            next_tick = time.monotonic()
+            while not stop.is_set():
+                try:
                     shot = sct.grab(monitor)
-                    frame = np.array(shot)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                    frame = cv2.resize(frame, (800, 600))
-                    
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-                    compressed = buffer.tobytes()
-                    frame_b64 = base64.b64encode(compressed).decode('utf-8')
-                    
-                    msg = self.encode_message('SCREEN_FRAME', {'frame': frame_b64})
-                    self.tcp_socket.sendall(msg)
+                    # View over the grab's own buffer; every grab gets a fresh one, so no copy
+                    self.put_latest(encode_q, np.asarray(shot))
+                except:
+                    pass
+                
+                next_tick = self.pace(next_tick, 1.0 / 10)
+        except:
+            pass
+        finally:
+            self.screen_capturer = None
+            if sct:
+                try:
+                    sct.close()
+                except:
+                    pass
+    
+    def screen_encode_loop(self, encode_q, stop):
+        """Screen encode stage: OpenCV drops the GIL while converting and encoding"""
+        seq = 0
+        last_digest, last_sent = None, 0.0
+        while not stop.is_set():
+            try:
+                frame = encode_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            # Idle desktop: skip the convert/resize/encode and the whole chunk burst
+            digest, now = frame_digest(frame), time.monotonic()
+            if digest == last_digest and now - last_sent < UNCHANGED_FRAME_RESEND:
+                continue
+            last_digest, last_sent = digest, now
+            
+            try:
+                # Downsample the full desktop first, then drop alpha on the small image:
+                # one full-size pass instead of two
+                frame = cv2.resize(frame, (800, 600), interpolation=cv2.INTER_AREA)
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
                 
-                time.sleep(1.0 / 10)
+                jpeg = jpeg_encode(frame, 70)
+                if jpeg:
+                    seq = (seq + 1) & 0xFFFF
+                    self.send_screen_frame(jpeg, seq)
             except:
                 pass
     
+    def send_screen_frame(self, jpeg, seq):
+        """Send one screen JPEG as raw UDP chunks (no base64, no JSON)"""
+        prefix = self.screen_prefix
+        nchunks = (len(jpeg) + SCREEN_CHUNK_SIZE - 1) // SCREEN_CHUNK_SIZE
+        view = memoryview(jpeg)
+        dest = self.udp_dest
+        idx = 0
+        
+        if self.udp_gso:
+            # Lay the datagrams out back to back (prefix, header, chunk, ...) and let the
+            # kernel cut them at segment_size; every one but the frame's last is full size
+            segment_size = len(prefix) + SCREEN_HEADER.size + SCREEN_CHUNK_SIZE
+            per_call = min(GSO_MAX_SEGMENTS, GSO_MAX_BYTES // segment_size)
+            gso = [(SOL_UDP, UDP_SEGMENT, struct.pack('=H', segment_size))]
+            try:
+                while idx < nchunks:
+                    buffers = []
+                    for i in range(idx, min(idx + per_call, nchunks)):
+                        buffers += (prefix, SCREEN_HEADER.pack(seq, nchunks, i),
+                                    view[i * SCREEN_CHUNK_SIZE:(i + 1) * SCREEN_CHUNK_SIZE])
+                    self.udp_socket.sendmsg(buffers, gso, 0, dest)
+                    idx = min(idx + per_call, nchunks)
+                return
+            except OSError:
+                self.udp_gso = False  # no GSO here: send the rest one datagram at a time
+        
+        for idx in range(idx, nchunks):
+            chunk = view[idx * SCREEN_CHUNK_SIZE:(idx + 1) * SCREEN_CHUNK_SIZE]
+            self.send_udp(prefix, SCREEN_HEADER.pack(seq, nchunks, idx), chunk)
+    
     def stop_screen(self):
         """Stop screen share"""
         self.screen_on = False
-        if self.screen_capturer:
-            try:
-                self.screen_capturer.close()
-            except:
-                pass
-            self.screen_capturer = None
+        self.screen_stop.set()  # screen_loop closes its capturer on the way out
         
         msg = self.encode_message('SCREEN_STOP', {})
         try:
-            self.tcp_socket.sendall(msg)
+            self.send_tcp(msg)
         except:
             pass
     
@@ -720,201 +1273,468 @@ class IntraConnectClient:
     def encode_message(self, msg_type, data):
         """Encode message"""
         message = {'type': msg_type, 'data': data}
-        msg_json = json.dumps(message)
-        msg_bytes = msg_json.encode('utf-8')
+        if orjson:
+            msg_bytes = orjson.dumps(message)
+        else:
+            msg_bytes = json.dumps(message).encode('utf-8')
         length = struct.pack('>I', len(msg_bytes))
         return length + msg_bytes
     
+    def decode_message(self, msg_bytes):
+        """Decode message"""
+        if orjson:
+            return orjson.loads(msg_bytes)
+        return json.loads(msg_bytes.decode('utf-8'))
+    
+    def encode_binary(self, opcode, filename, payload):
+        """Encode binary frame: opcode, filename and raw payload"""
+        name = filename.encode('utf-8')
+        body_len = 3 + len(name) + len(payload)
+        return struct.pack('>IBH', BINARY_FLAG | body_len, opcode, len(name)) + name + payload
+    
+    def send_tcp(self, data):
+        """Send a framed message; serialized so concurrent senders never interleave"""
+        with self.tcp_send_lock:
+            self.tcp_socket.sendall(data)
+    
+    def send_udp(self, *parts):
+        """Send parts as one datagram to the server; gathered by sendmsg instead of concatenated"""
+        if hasattr(self.udp_socket, 'sendmsg'):
+            # Never block a media thread (or the audio callback) on a full send buffer:
+            # a stale packet is worth less than the next one, so let it raise and drop
+            self.udp_socket.sendmsg(parts, (), MSG_DONTWAIT, self.udp_dest)
+        else:
+            # Windows sockets have no sendmsg
+            self.udp_socket.sendto(b''.join(parts), self.udp_dest)
+    
+    def tune_udp_socket(self, sock):
+        """Enlarge media socket buffers and mark packets as expedited (DSCP EF)"""
+        for level, option, value in (
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024),
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024),
+            (socket.IPPROTO_IP, getattr(socket, 'IP_TOS', 3), 0xB8),
+        ):
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError:
+                pass
+        if sys.platform.startswith('linux'):
+            # Spin up to 50 us on the NIC queue before sleeping in recv; needs CAP_NET_ADMIN
+            # to raise above net.core.busy_read, so failure is expected and harmless
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, getattr(socket, 'SO_BUSY_POLL', 46), 50)
+            except OSError:
+                pass
+    
     def tcp_receiver(self):
-        """TCP receiver"""
+        """TCP receiver: fill one reusable buffer and parse every complete frame it holds"""
+        buf = bytearray(1024 * 1024)
+        view = memoryview(buf)
+        start = end = 0  # unparsed bytes are buf[start:end]
         while self.connected:
             try:
-                length_data = self.tcp_socket.recv(4)
-                if not length_data:
+                if end == len(buf):
+                    pending = end - start
+                    if start:
+                        # Slide the partial frame to the front
+                        view[:pending] = view[start:end]
+                    else:
+                        # A single frame larger than the buffer: grow it
+                        grown = bytearray(len(buf) * 2)
+                        grown[:pending] = view[:pending]
+                        buf, view = grown, memoryview(grown)
+                    start, end = 0, pending
+                
+                received = self.tcp_socket.recv_into(view[end:])
+                if not received:
                     break
+                end += received
                 
-                msg_length = struct.unpack('>I', length_data)[0]
-                msg_data = b''
-                while len(msg_data) < msg_length:
-                    chunk = self.tcp_socket.recv(min(msg_length - len(msg_data), 4096))
-                    if not chunk:
+                while end - start >= 4:
+                    msg_length = struct.unpack_from('>I', buf, start)[0]
+                    is_binary = msg_length & BINARY_FLAG
+                    msg_length &= ~BINARY_FLAG
+                    if end - start - 4 < msg_length:
                         break
-                    msg_data += chunk
-                
-                if len(msg_data) != msg_length:
-                    continue
+                    body = start + 4
+                    start = body + msg_length
+                    
+                    # A malformed frame or a failing handler costs that frame, not the session
+                    try:
+                        if is_binary:
+                            opcode, name_len = struct.unpack_from('>BH', buf, body)
+                            filename = bytes(view[body + 3:body + 3 + name_len]).decode('utf-8')
+                            # Payload is a view into buf, consumed before the next recv_into
+                            self.handle_binary(opcode, filename, view[body + 3 + name_len:start])
+                        else:
+                            message = self.decode_message(bytes(view[body:start]))
+                            self.handle_message(message)
+                    except Exception as e:
+                        print(f"Error handling message: {e}")
                 
-                msg_json = msg_data.decode('utf-8')
-                message = json.loads(msg_json)
-                self.handle_message(message)
-            except:
+                if start == end:
+                    start = end = 0
+            except OSError:
                 break
         
         self.connected = False
     
     def udp_receiver(self):
         """UDP receiver"""
+        if libc_recvmmsg is not None:
+            try:
+                self.udp_receive_batched()
+                return
+            except OSError as e:
+                if not self.connected:
+                    return
+                print(f"recvmmsg unavailable, reading datagrams one by one: {e}")
+        
+        # One reusable buffer: handle_udp_packet copies out whatever it keeps
+        buf = bytearray(UDP_MAX_DATAGRAM)
+        view = memoryview(buf)
         while self.connected:
             try:
-                data, addr = self.udp_socket.recvfrom(65536)
-                
-                parts = data.split(b':', 2)
-                if len(parts) < 3:
+                size = self.udp_socket.recv_into(buf)
+            except OSError:
+                continue
+            try:
+                self.handle_udp_packet(view[:size])
+            except Exception:
+                pass  # one malformed datagram must not stop the receiver
+    
+    def udp_receive_batched(self):
+        """Receive with recvmmsg into a fixed pool of buffers, dispatching every datagram reaped"""
+        bufs = [bytearray(UDP_MAX_DATAGRAM) for _ in range(UDP_BATCH)]
+        views = [memoryview(buf) for buf in bufs]
+        iovs = (iovec * UDP_BATCH)()
+        msgs = (mmsghdr * UDP_BATCH)()
+        for i, buf in enumerate(bufs):
+            iovs[i].iov_base = ctypes.addressof(ctypes.c_char.from_buffer(buf))
+            iovs[i].iov_len = len(buf)
+            msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovs[i])
+            msgs[i].msg_hdr.msg_iovlen = 1
+        
+        while self.connected:
+            # Blocks for the first datagram, then takes whatever else is already queued
+            count = libc_recvmmsg(self.udp_socket.fileno(), msgs, UDP_BATCH, MSG_WAITFORONE, None)
+            if count < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
                     continue
-                
-                msg_type = parts[0].decode('utf-8')
-                username = parts[1].decode('utf-8')
-                payload = parts[2]
-                
-                if msg_type == 'VIDEOFRAME':
-                    nparr = np.frombuffer(payload, np.uint8)
-                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    if frame is not None:
-                        slot = self.username_to_slot.get(username)
-                        if slot is None:
-                            # Allocate next available slot
-                            for s in range(1, len(self.video_displays)):
-                                if s not in self.username_to_slot.values():
-                                    self.username_to_slot[username] = s
-                                    try:
-                                        self.video_displays[s]['name'].configure(text=username)
-                                    except:
-                                        pass
-                                    slot = s
-                                    break
-                        
-                        if slot is not None and slot < len(self.video_displays):
-                            self.update_video(slot, frame, username)
-                
-                elif msg_type == 'AUDIOFRAME':
-                    # FIXED: Only play audio from OTHER users, not yourself
-                    if username != self.username:
-                        if hasattr(self, 'audio_out_stream') and self.audio_out_stream and self.audio_out_stream.active:
-                            try:
-                                audio_data = np.frombuffer(payload, dtype='int16')
-                                self.audio_out_stream.write(audio_data)
-                            except Exception as e:
-                                print(f"Error playing audio: {e}")
-            except:
-                pass
+                raise OSError(err, os.strerror(err))
+            
+            for i in range(count):
+                try:
+                    # View into a pooled buffer: valid until the next recvmmsg
+                    self.handle_udp_packet(views[i][:msgs[i].msg_len])
+                except Exception:
+                    pass
     
-    def handle_message(self, message):
-        """Handle TCP message"""
-        msg_type = message.get('type')
-        data = message.get('data', {})
+    def handle_udp_packet(self, packet):
+        """Dispatch one TYPE:username:payload datagram.
+        
+        packet may be a view into a reused receive buffer, so anything kept past this
+        call (queued for decode, held for reassembly) must be copied out first.
+        """
+        # The text header sits in the first few dozen bytes; parse it from a short copy
+        head = bytes(packet[:128])
+        first = head.find(b':')
+        second = head.find(b':', first + 1) if first >= 0 else -1
+        if second < 0:
+            return
         
-        if msg_type == 'USER_LIST':
-            users = data.get('users', [])
-            if not self.ui_ready:
-                self.pending_users = users
-            else:
-                self.root.after(0, lambda u=users: self.update_users(u))
+        msg_type = head[:first].decode('utf-8')
+        username = head[first + 1:second].decode('utf-8')
+        payload = packet[second + 1:]
         
-        elif msg_type == 'CHAT':
-            self.root.after(0, lambda: self.add_chat_msg(data['username'], data['message']))
+        if msg_type == 'VIDEOFRAME':
+            if len(payload) <= VIDEO_HEADER.size:
+                return
+            # Drop anything not newer than the last frame taken from this user (16-bit serial compare)
+            seq, = VIDEO_HEADER.unpack_from(payload)
+            last = self.video_rx_seq.get(username)
+            if last is not None and not 0 < (seq - last) & 0xFFFF < 0x8000:
+                return
+            self.video_rx_seq[username] = seq
+            
+            # The tile's name is set on its first repaint
+            slot = self.username_to_slot.get(username)
+            if slot is None:
+                slot = self.assign_slot(username)
+            
+            # Skip decoding entirely while the tiles are minimized or behind another panel
+            if not self.window_mapped or self.current_panel != 'video':
+                return
+            
+            if slot is not None and slot < len(self.video_displays):
+                # Decoded later on the pool, so take it out of the receive buffer
+                self.submit_frame(slot, jpeg=bytes(payload[VIDEO_HEADER.size:]), name=username)
         
-        elif msg_type == 'VIDEO_FRAME':
-            try:
-                username = data.get('username')
-                frame_b64 = data.get('frame')
-                if not username or not frame_b64:
-                    return
-                
-                frame_data = base64.b64decode(frame_b64)
-                nparr = np.frombuffer(frame_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                if frame is None:
-                    return
-                
-                slot = self.username_to_slot.get(username)
-                if slot is None:
-                    # Allocate next available slot
-                    for s in range(1, len(self.video_displays)):
-                        if s not in self.username_to_slot.values():
-                            self.username_to_slot[username] = s
-                            try:
-                                self.video_displays[s]['name'].configure(text=username)
-                            except:
-                                pass
-                            slot = s
-                            break
-                
-                if slot is not None:
-                    self.root.after(0, lambda s=slot, f=frame, u=username: self.update_video(s, f, u))
-            except:
-                pass
+        elif msg_type == 'SCREENFRAME':
+            self.receive_screen_chunk(username, payload)
         
-        elif msg_type == 'FILE_INFO':
-            self.root.after(0, lambda: self.add_file_item(data))
-            self.root.after(0, lambda: self.show_toast(f"{data.get('uploader','Someone')} shared {data.get('filename','a file')}"))
+        elif msg_type == 'AUDIOFRAME':
+            # Only play audio from OTHER users; the block outlives the receive buffer, so copy it
+            if username != self.username and self.audio_out_stream:
+                self.audio_out_q.append(np.frombuffer(payload, dtype='int16').copy())
         
-        elif msg_type == 'FILE_CHUNK':
-            filename = data['filename']
-            file_data = data['chunk'].encode('latin-1')
-            filepath = os.path.join(self.downloads_folder, filename)
-            with open(filepath, 'wb') as f:
-                f.write(file_data)
-            self.root.after(0, lambda: messagebox.showinfo("Download", f"Saved: {filepath}"))
+        elif msg_type == 'AUDIOOPUS':
+            if username != self.username and opuslib and self.audio_out_stream:
+                try:
+                    decoder = self.opus_decoders.get(username)
+                    if decoder is None:
+                        decoder = self.opus_decoders[username] = opuslib.Decoder(self.sample_rate, 1)
+                    pcm = decoder.decode(bytes(payload), self.audio_block)
+                    self.audio_out_q.append(np.frombuffer(pcm, dtype='int16'))
+                except Exception as e:
+                    print(f"Error playing audio: {e}")
+    
+    def reset_screen_rx(self, username=None):
+        """Forget the frame being reassembled so the next share's sequence starts fresh"""
+        self.screen_rx_user = username
+        self.screen_rx_seq = None
+        self.screen_rx_chunks = []
+        self.screen_rx_count = 0
+    
+    def receive_screen_chunk(self, username, payload):
+        """Reassemble a screen frame from its UDP chunks; a newer frame abandons a partial one"""
+        if len(payload) < SCREEN_HEADER.size:
+            return
+        seq, nchunks, idx = SCREEN_HEADER.unpack_from(payload)
+        if idx >= nchunks:
+            return
         
-        elif msg_type == 'SCREEN_START':
-            pass
+        if username != self.screen_rx_user:
+            self.reset_screen_rx(username)  # new presenter: their numbering is unrelated
         
-        elif msg_type == 'SCREEN_STOP':
-            def reset_screen():
-                try:
-                    if self.screen_popup_label:
-                        self.screen_popup_label.configure(text="🖥️ No screen being shared", image=None)
-                except:
-                    pass
-            self.root.after(0, reset_screen)
+        if seq != self.screen_rx_seq:
+            # Late chunk of a frame we already gave up on (16-bit serial number compare)
+            if self.screen_rx_seq is not None and (seq - self.screen_rx_seq) & 0xFFFF >= 0x8000:
+                return
+            self.screen_rx_seq = seq
+            self.screen_rx_chunks = [None] * nchunks
+            self.screen_rx_count = 0
         
-        elif msg_type == 'SCREEN_FRAME':
+        chunks = self.screen_rx_chunks
+        if idx >= len(chunks) or chunks[idx] is not None:
+            return
+        chunks[idx] = bytes(payload[SCREEN_HEADER.size:])  # outlives the receive buffer
+        self.screen_rx_count += 1
+        
+        if self.screen_rx_count == len(chunks):
+            self.screen_rx_chunks = []
+            self.screen_rx_count = 0
+            if not self.screen_popup_mapped:
+                return  # viewer closed or minimized: nothing to decode for
+            frame = jpeg_decode(b''.join(chunks))
+            if is_bgr8(frame):
+                # Scale and colour-convert here, off the Tk thread, into reused buffers
+                if frame.shape[:2] != (600, 800):
+                    frame = cv2.resize(frame, (800, 600), dst=self.screen_bgr, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.screen_rgb)
+                # Latest frame wins: replace any frame the UI hasn't painted yet
+                self.pending_screen = bytes(self.screen_ppm)
+    
+    def handle_message(self, message):
+        """Handle TCP message"""
+        handler = self.message_handlers.get(message.get('type'))
+        if handler:
+            handler(message.get('data', {}))
+    
+    def handle_user_list(self, data):
+        """Refresh the user list, or hold it until the UI exists"""
+        users = data.get('users', [])
+        if not self.ui_ready:
+            self.pending_users = users
+        else:
+            self.post_ui(self.update_users, users)
+    
+    def handle_chat(self, data):
+        """Show an incoming chat message"""
+        self.post_ui(self.add_chat_msg, data['username'], data['message'])
+    
+    def handle_video_frame(self, data):
+        """Queue a base64 video frame relayed over TCP"""
+        try:
+            username = data.get('username')
+            frame_b64 = data.get('frame')
+            if not username or not frame_b64:
+                return
+            if not self.window_mapped or self.current_panel != 'video':
+                return
+            
+            frame_data = base64.b64decode(frame_b64)
+            nparr = np.frombuffer(frame_data, np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if frame is None:
+                return
+            
+            slot = self.username_to_slot.get(username)
+            if slot is None:
+                slot = self.assign_slot(username)
+            
+            if slot is not None:
+                self.submit_frame(slot, frame=frame, name=username)
+        except:
+            pass
+    
+    def handle_file_info(self, data):
+        """List a newly shared file"""
+        self.post_ui(self.add_file_item, data)
+        self.post_ui(self.show_toast, f"{data.get('uploader','Someone')} shared {data.get('filename','a file')}")
+    
+    def handle_file_start(self, data):
+        """Open the target file for an incoming download"""
+        filename = os.path.basename(data['filename'])
+        filepath = os.path.join(self.downloads_folder, filename)
+        if filename in self.downloads:
+            # Restarted transfer of the same file: drop the unfinished one
+            os.close(self.downloads.pop(filename)['fd'])
+        try:
+            fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as e:
+            self.post_ui(messagebox.showerror, "Download", f"Could not save {filename}: {e}")
+            return
+        self.downloads[filename] = {
+            'fd': fd,
+            'path': filepath,
+            'remaining': data['size']
+        }
+        if data['size'] > 0 and hasattr(os, 'posix_fallocate'):
+            # Reserve the whole file up front so chunks land in few extents; a filesystem
+            # that can't preallocate is fine, but no room for the file fails it now
             try:
-                frame_data = base64.b64decode(data['frame'])
-                nparr = np.frombuffer(frame_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                if frame is not None:
-                    self.root.after(0, lambda f=frame: self.display_screen(f))
+                os.posix_fallocate(fd, 0, data['size'])
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.EOPNOTSUPP, errno.ENOSYS):
+                    self.fail_download(filename, e)
+                    return
+        if data['size'] <= 0:
+            self.finish_download(filename)
+    
+    def handle_screen_start(self, data):
+        """A share is starting: its frame numbers restart from 1"""
+        self.reset_screen_rx(data.get('presenter'))
+    
+    def handle_screen_stop(self, data):
+        """Clear the screen viewer when sharing ends"""
+        self.reset_screen_rx()
+        def reset_screen():
+            try:
+                if self.screen_popup_label:
+                    self.screen_popup_label.configure(text="🖥️ No screen being shared", image=None)
+                    self.screen_photo_shown = False
             except:
                 pass
-        
-        elif msg_type == 'VIDEO_STOP':
-            username = data['username']
+        self.post_ui(reset_screen)
+    
+    def handle_video_stop(self, data):
+        """Blank a user's tile when their camera stops"""
+        # video_active and the label are only touched on the Tk thread, in order with repaints
+        self.post_ui(self.show_video_off, data['username'])
+    
+    def show_video_off(self, username):
+        """Tk thread: put a tile back on the camera-off placeholder"""
+        slot = self.username_to_slot.get(username)
+        try:
+            if slot is not None and slot < len(self.video_displays):
+                self.video_displays[slot]['video_active'] = False
+                if self.blank_ctk_i:
+                    self.video_displays[slot]['label'].configure(
+                        text="📷 Off",
+                        image=self.blank_ctk_i
+                    )
+                self.video_displays[slot]['name'].configure(text=username)
+        except:
+            pass
+    
+    def handle_speaking_status(self, data):
+        """Highlight a tile while its user is speaking"""
+        self.post_ui(self.show_speaking, data['username'], data['speaking'])
+    
+    def show_speaking(self, username, speaking):
+        """Tk thread: draw or clear a tile's speaking border"""
+        # Find user's slot
+        slot = None
+        if username == self.username:
+            slot = 0
+        else:
             slot = self.username_to_slot.get(username)
+        
+        if slot is not None:
             try:
-                if slot is not None and slot < len(self.video_displays):
-                    self.video_displays[slot]['video_active'] = False
-                    if self.blank_ctk_i:
-                        self.video_displays[slot]['label'].configure(
-                            text="📷 Off",
-                            image=self.blank_ctk_i
-                        )
-                    self.video_displays[slot]['name'].configure(text=username)
+                if speaking:
+                    self.video_displays[slot]['frame'].configure(border_width=3, border_color="#00ff88")
+                else:
+                    self.video_displays[slot]['frame'].configure(border_width=0)
             except:
                 pass
-        
-        elif msg_type == 'SPEAKING_STATUS':
-            username = data['username']
-            speaking = data['speaking']
-            
-            # Find user's slot
-            slot = None
-            if username == self.username:
-                slot = 0
-            else:
-                slot = self.username_to_slot.get(username)
-            
-            if slot is not None:
-                try:
-                    if speaking:
-                        self.video_displays[slot]['frame'].configure(border_width=3, border_color="#00ff88")
-                    else:
-                        self.video_displays[slot]['frame'].configure(border_width=0)
-                except:
-                    pass
+    
+    def handle_binary(self, opcode, filename, payload):
+        """Handle binary TCP frame"""
+        if opcode == BIN_FILE_CHUNK:
+            filename = os.path.basename(filename)
+            download = self.downloads.get(filename)
+            if download is None:
+                return
+            try:
+                # os.write may take only part of the buffer; keep going until all of it is on disk
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(download['fd'], view):]
+            except OSError as e:
+                self.fail_download(filename, e)
+                return
+            download['remaining'] -= len(payload)
+            if download['remaining'] <= 0:
+                self.finish_download(filename)
+    
+    def finish_download(self, filename):
+        """Close a completed download and notify the user"""
+        download = self.downloads.pop(filename)
+        os.close(download['fd'])
+        filepath = download['path']
+        self.post_ui(messagebox.showinfo, "Download", f"Saved: {filepath}")
+    
+    def fail_download(self, filename, error):
+        """Abandon a download: close and delete the partial file, tell the user; the session goes on"""
+        download = self.downloads.pop(filename)
+        os.close(download['fd'])
+        with contextlib.suppress(OSError):
+            os.remove(download['path'])
+        self.post_ui(messagebox.showerror, "Download", f"Could not save {filename}: {error}")
     
     # UI Updates
     
+    def post_ui(self, fn, *args, **kwargs):
+        """Schedule fn on the Tk thread; safe to call from any thread"""
+        self.ui_queue.put((fn, args, kwargs))
+    
+    def drain_ui_queue(self):
+        """Run queued UI updates, at most 64 per tick"""
+        # ~60 Hz while frames are flowing, slower once the UI has been idle for a while
+        now = time.monotonic()
+        idle = now - self.ui_last_busy
+        delay = 16 if idle < 1.0 else 66 if idle < 5.0 else 200
+        # Reschedule first so modal dialogs opened below don't stall the queue
+        self.root.after(delay, self.drain_ui_queue)
+        # Paint only the newest screen frame that arrived since the last tick
+        ppm, self.pending_screen = self.pending_screen, None
+        if ppm is not None:
+            self.ui_last_busy = now
+            self.display_screen(ppm)
+        for _ in range(64):
+            try:
+                fn, args, kwargs = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.ui_last_busy = now
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"UI update error: {e}")
+    
     def switch_panel(self, panel_name):
         for name, panel in self.panels.items():
             if str(panel.winfo_manager()):
@@ -924,6 +1744,16 @@ class IntraConnectClient:
             self.panels[panel_name].pack(fill="both", expand=True)
         
         self.current_panel = panel_name
+        
+        if panel_name == 'files':
+            self.refresh_file_rows()
+    
+    def on_window_map(self, event):
+        """Track whether the main window and screen viewer are on screen (children's map events also land here)"""
+        if event.widget is self.root:
+            self.window_mapped = str(event.type) == 'Map'
+        elif event.widget is self.screen_popup:
+            self.screen_popup_mapped = str(event.type) == 'Map'
     
     def open_screen_popup(self):
         try:
@@ -945,59 +1775,136 @@ class IntraConnectClient:
         )
         self.screen_popup_label.pack(expand=True, fill="both", padx=10, pady=10)
         
+        # One PhotoImage for the popup's lifetime; frames are put into it as PPM data
+        self.screen_photo = PhotoImage(master=self.screen_popup, width=800, height=600)
+        self.screen_photo_shown = False
+        self.screen_popup.bind("<Map>", self.on_window_map, add="+")
+        self.screen_popup.bind("<Unmap>", self.on_window_map, add="+")
+        
         def on_close():
             try:
                 self.screen_popup.destroy()
             except:
                 pass
             self.screen_popup = None
+            self.screen_popup_mapped = False
             self.screen_popup_label = None
+            self.screen_photo = None
         
         self.screen_popup.protocol("WM_DELETE_WINDOW", on_close)
     
-    def update_video(self, slot, frame, name=""):
-        """Update video display"""
+    def submit_frame(self, slot, frame=None, jpeg=None, name=""):
+        """Queue a tile frame (decoded, or as JPEG) for the decode pool, latest frame wins"""
+        with self.decode_lock:
+            if slot in self.decode_busy:
+                self.decode_waiting[slot] = (frame, jpeg, name)
+                return
+            self.decode_busy.add(slot)
+        self.decode_pool.submit(self.prep_frame, slot, frame, jpeg, name)
+    
+    def finish_decode(self, slot):
+        """Free a tile for the next frame, starting the newest one that arrived meanwhile"""
+        with self.decode_lock:
+            waiting = self.decode_waiting.pop(slot, None)
+            if waiting is None:
+                self.decode_busy.discard(slot)
+                return
         try:
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            img = img.resize((320, 240))
-            ctk_i = ctk.CTkImage(light_image=img, size=(320, 240))
-            
-            self.video_displays[slot]['label'].configure(image=ctk_i, text="")
-            self.video_displays[slot]['label'].image = ctk_i
-            self.video_displays[slot]['video_active'] = True
+            self.decode_pool.submit(self.prep_frame, slot, *waiting)
+        except RuntimeError:
+            pass  # pool already shut down on exit
+    
+    def prep_frame(self, slot, frame, jpeg, name):
+        """Decode pool: JPEG -> BGR -> 320x240 RGB in the tile's buffers -> PPM bytes"""
+        try:
+            if frame is None:
+                frame = jpeg_decode(jpeg)
+            if not is_bgr8(frame):
+                self.finish_decode(slot)
+                return
+            # Shrink first (area averaging), then colour-convert only the small image;
+            # peers' 320x240 frames are already tile-sized and skip the resize
+            if frame.shape[:2] == (240, 320):
+                resized = frame
+            else:
+                resized = cv2.resize(frame, (320, 240), dst=self.video_resize_bufs[slot], interpolation=cv2.INTER_AREA)
+            ppm, rgb = self.video_ppm_bufs[slot]
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=rgb)
+            # Tk parses PPM straight into the photo: no PIL image, no new PhotoImage per frame
+            self.post_ui(self.apply_frame, slot, bytes(ppm), name)
+        except:
+            self.finish_decode(slot)
+    
+    def apply_frame(self, slot, ppm, name=""):
+        """Tk thread: repaint a tile with the PPM image prepared by prep_frame"""
+        try:
+            if slot == 0 and not self.video_on:
+                return  # preview decoded before stop_video blanked our own tile
+            display = self.video_displays[slot]
+            display['photo'].put(ppm)
+            if not display['video_active']:
+                # First frame since the tile was blanked: attach the tile's photo once
+                display['label'].configure(image=display['photo'], text="")
+                display['video_active'] = True
             
             if name:
                 self.video_displays[slot]['name'].configure(text=name)
         except:
             pass
+        finally:
+            self.finish_decode(slot)
+    
+    def assign_slot(self, username):
+        """Give username the lowest free tile; None when every tile is taken"""
+        with self.slot_lock:
+            slot = self.username_to_slot.get(username)
+            if slot is None and self.free_slots:
+                slot = heapq.heappop(self.free_slots)
+                self.username_to_slot[username] = slot
+            return slot
+    
+    def release_slot(self, username):
+        """Return a departed user's tile to the free heap; gives back the tile freed, if any"""
+        with self.slot_lock:
+            slot = self.username_to_slot.pop(username, None)
+            if slot is not None:
+                heapq.heappush(self.free_slots, slot)
+            return slot
     
     def update_users(self, users):
         """Update user list"""
-        for widget in self.users_frame.winfo_children():
-            widget.destroy()
+        # Only add/remove the rows that changed instead of rebuilding the whole list
+        present = set(users)
+        for user in self.user_rows.keys() - present:
+            self.user_rows.pop(user).destroy()
+        
+        # A rejoining user starts a new sequence, with or without a tile
+        for uname in self.video_rx_seq.keys() - present:
+            self.video_rx_seq.pop(uname, None)
+        
+        # Blank and free the tiles of users who left before handing tiles to newcomers
+        for uname in self.username_to_slot.keys() - present:
+            slot = self.release_slot(uname)
+            try:
+                self.video_displays[slot]['video_active'] = False
+                if self.blank_ctk_i:
+                    self.video_displays[slot]['label'].configure(text="📷 Off", image=self.blank_ctk_i)
+                self.video_displays[slot]['name'].configure(text="")
+            except:
+                pass
         
         # Ensure slot exists
-        next_slot = 1
-        for user in sorted([u for u in users if u != self.username]):
-            if user not in self.username_to_slot:
-                # Find next free slot
-                while next_slot < len(self.video_displays) and next_slot in self.username_to_slot.values():
-                    next_slot += 1
-                if next_slot < len(self.video_displays):
-                    self.username_to_slot[user] = next_slot
-                    try:
-                        self.video_displays[next_slot]['name'].configure(text=user)
-                    except:
-                        pass
-                    next_slot += 1
-                else:
-                    try:
-                        self.video_displays[self.username_to_slot[user]].configure(text=user)
-                    except:
-                        pass
+        for user in sorted(present - self.username_to_slot.keys() - {self.username}):
+            slot = self.assign_slot(user)
+            if slot is not None:
+                try:
+                    self.video_displays[slot]['name'].configure(text=user)
+                except:
+                    pass
         
         for user in users:
+            if user in self.user_rows:
+                continue
             frame = ctk.CTkFrame(self.users_frame, fg_color="#2a2a2a", height=35, corner_radius=6)
             frame.pack(fill="x", pady=2)
             frame.pack_propagate(False)
@@ -1009,32 +1916,19 @@ class IntraConnectClient:
                 font=("Arial", 11),
                 anchor="w"
             ).pack(side="left", padx=10)
-        
-        # Remove mappings for users no longer present
-        present = set(users)
-        for uname, slot in list(self.username_to_slot.items()):
-            if uname != self.username and uname not in present:
-                try:
-                    if self.blank_ctk_i:
-                        self.video_displays[slot]['label'].configure(text="📷 Off", image=self.blank_ctk_i)
-                    self.video_displays[slot]['name'].configure(text="")
-                except:
-                    pass
-                del self.username_to_slot[uname]
+            self.user_rows[user] = frame
     
-    def display_screen(self, frame):
-        """Display screen frame"""
+    def display_screen(self, ppm):
+        """Display an 800x600 screen frame given as PPM data"""
         try:
-            if not self.screen_popup_label:
+            if not self.screen_popup_label or not self.screen_photo:
                 return
             
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            img = img.resize((800, 600))
-            ctk_i = ctk.CTkImage(light_image=img, size=(800, 600))
+            self.screen_photo.put(ppm)
             
-            self.screen_popup_label.configure(image=ctk_i, text="")
-            self.screen_popup_label.image = ctk_i
+            if not self.screen_photo_shown:
+                self.screen_popup_label.configure(image=self.screen_photo, text="")
+                self.screen_photo_shown = True
         except:
             pass
     
@@ -1066,13 +1960,13 @@ class IntraConnectClient:
     
     # Chat
     
-    def send_chat(self):
-        """Send chat"""
+    def send_chat(self, event=None):
+        """Send chat (button or <Return> in the entry)"""
         msg_text = self.chat_entry.get().strip()
         if msg_text and self.connected:
             msg = self.encode_message('CHAT', {'message': msg_text})
             try:
-                self.tcp_socket.sendall(msg)
+                self.send_tcp(msg)
                 self.add_chat_msg(self.username, msg_text, own=True)
                 self.chat_entry.delete(0, 'end')
             except:
@@ -1090,10 +1984,6 @@ class IntraConnectClient:
             self.chat_box.insert("end", f"[{timestamp}] {user}\n", "time")
             self.chat_box.insert("end", f"{msg}\n\n", "other")
         
-        self.chat_box.tag_config("time", foreground="gray")
-        self.chat_box.tag_config("own", foreground="#00ff88")
-        self.chat_box.tag_config("other", foreground="white")
-        
         self.chat_box.configure(state="disabled")
         self.chat_box.see("end")
     
@@ -1103,74 +1993,126 @@ class IntraConnectClient:
         """Upload file"""
         filepath = filedialog.askopenfilename()
         if filepath:
-            try:
-                filename = os.path.basename(filepath)
-                filesize = os.path.getsize(filepath)
-                
-                # Send file info
-                msg = self.encode_message('FILE_INFO', {'filename': filename, 'size': filesize})
-                self.tcp_socket.sendall(msg)
-                
-                # Send file data
-                with open(filepath, 'rb') as f:
-                    file_data = f.read()
-                
-                msg = self.encode_message('FILE_CHUNK', {'filename': filename, 'chunk': file_data.decode('latin-1')})
-                self.tcp_socket.sendall(msg)
-                
-                messagebox.showinfo("Success", f"Uploaded: {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Upload failed: {e}")
+            threading.Thread(target=self.upload_worker, args=(filepath,), daemon=True).start()
+    
+    def upload_worker(self, filepath):
+        """Stream a file to the server in fixed-size binary chunks"""
+        try:
+            filename = os.path.basename(filepath)
+            filesize = os.path.getsize(filepath)
+            
+            # Send file info
+            msg = self.encode_message('FILE_INFO', {'filename': filename, 'size': filesize})
+            self.send_tcp(msg)
+            
+            # Send file data
+            with open(filepath, 'rb') as f:
+                while chunk := f.read(FILE_CHUNK_SIZE):
+                    self.send_tcp(self.encode_binary(BIN_FILE_CHUNK, filename, chunk))
+            
+            self.post_ui(messagebox.showinfo, "Success", f"Uploaded: {filename}")
+        except Exception as e:
+            self.post_ui(messagebox.showerror, "Error", f"Upload failed: {e}")
     
     def download_file(self, filename):
         """Download file"""
         msg = self.encode_message('FILE_REQUEST', {'filename': filename})
         try:
-            self.tcp_socket.sendall(msg)
+            self.send_tcp(msg)
         except:
             pass
     
     def add_file_item(self, data):
-        """Add file to list"""
+        """Record a shared file; its row is only built while the files panel is shown"""
         filename = data['filename']
-        filesize = data['size']
-        uploader = data['uploader']
-        
-        if filename in self.file_items:
-            return
-        
+        i = self.file_index.get(filename)
+        if i is None:
+            self.file_index[filename] = len(self.file_names)
+            self.file_names.append(filename)
+            self.file_sizes.append(data['size'])
+            self.file_uploaders.append(data['uploader'])
+        else:
+            self.file_sizes[i] = data['size']
+            self.file_uploaders[i] = data['uploader']
+        self.stale_file_rows[filename] = None
+        if self.current_panel == 'files':
+            self.refresh_file_rows()
+    
+    def refresh_file_rows(self):
+        """Build rows for newly shared files and update rows of re-shared ones"""
+        for filename in self.stale_file_rows:
+            i = self.file_index[filename]
+            
+            row = self.file_items.get(filename)
+            if row is None:
+                row = self.build_file_row()
+                self.file_items[filename] = row
+                self.begin_file_list_update()
+                self.pending_file_rows.append(row)
+            
+            row.name_label.configure(text=filename)
+            row.meta_label.configure(text=f"{self.file_sizes[i]} bytes • by {self.file_uploaders[i]}")
+            row.download_btn.configure(command=functools.partial(self.download_file, filename))
+        self.stale_file_rows.clear()
+    
+    def begin_file_list_update(self):
+        """Defer packing new rows to one idle pass so a burst of files lays out once"""
+        if not self.pending_file_rows:
+            self.root.after_idle(self.end_file_list_update)
+    
+    def end_file_list_update(self):
+        """Pack all rows added since begin_file_list_update"""
+        rows, self.pending_file_rows = self.pending_file_rows, []
+        for row in rows:
+            row.pack(fill="x", pady=3)
+    
+    def make_download_icon(self):
+        """Draw the download arrow once; every row button reuses the same image"""
+        icon = Image.new('RGBA', (32, 32), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(icon)
+        draw.rectangle((13, 3, 18, 16), fill="white")
+        draw.polygon([(6, 14), (25, 14), (15.5, 24)], fill="white")
+        draw.rectangle((5, 26, 26, 29), fill="white")
+        return ctk.CTkImage(light_image=icon, dark_image=icon, size=(16, 16))
+    
+    def build_file_row(self):
+        """Build the widgets for one file row; add_file_item fills in the text"""
+        # One frame per row, children gridded directly on it (no nested info frame)
         file_frame = ctk.CTkFrame(self.files_list, fg_color="#2a2a2a", height=60, corner_radius=8)
-        file_frame.pack(fill="x", pady=3)
-        file_frame.pack_propagate(False)
-        
-        info_frame = ctk.CTkFrame(file_frame, fg_color="transparent")
-        info_frame.pack(side="left", fill="both", expand=True, padx=10, pady=8)
+        file_frame.grid_propagate(False)
+        file_frame.grid_columnconfigure(0, weight=1)
+        file_frame.grid_rowconfigure((0, 1), weight=1)
         
-        ctk.CTkLabel(
-            info_frame,
-            text=filename,
+        file_frame.name_label = ctk.CTkLabel(
+            file_frame,
+            text="",
             font=("Arial", 11, "bold"),
             anchor="w"
-        ).pack(anchor="w")
+        )
+        file_frame.name_label.grid(row=0, column=0, sticky="sw", padx=10, pady=(8, 0))
         
-        ctk.CTkLabel(
-            info_frame,
-            text=f"{filesize} bytes • by {uploader}",
+        file_frame.meta_label = ctk.CTkLabel(
+            file_frame,
+            text="",
             font=("Arial", 9),
             text_color="gray",
             anchor="w"
-        ).pack(anchor="w")
+        )
+        file_frame.meta_label.grid(row=1, column=0, sticky="nw", padx=10, pady=(0, 8))
         
-        ctk.CTkButton(
+        file_frame.download_btn = ctk.CTkButton(
             file_frame,
-            text="⬇ Download",
+            text="Download",
+            image=self.download_icon,
+            compound="left",
+            hover=False,  # no hover repaint of every row's button canvas
             width=90,
             height=35,
-            font=("Arial", 10, "bold"),
-            command=lambda: self.download_file(filename)
-        ).pack(side="right", padx=10)
+            font=("Arial", 10, "bold")
+        )
+        file_frame.download_btn.grid(row=0, column=1, rowspan=2, padx=10)
         
-        self.file_items[filename] = file_frame
+        return file_frame
     
     # App lifecycle
     
@@ -1179,63 +2121,95 @@ class IntraConnectClient:
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.root.mainloop()
     
+    def flush_pending_sends(self):
+        """Write all queued frames with one scatter/gather call instead of joining them"""
+        if not self.pending_sends:
+            return
+        frames, self.pending_sends = self.pending_sends, []
+        with self.tcp_send_lock:
+            if hasattr(self.tcp_socket, 'sendmsg'):
+                sent = self.tcp_socket.sendmsg(frames)
+                total = sum(len(f) for f in frames)
+                if sent < total:
+                    self.tcp_socket.sendall(b''.join(frames)[sent:])
+            else:
+                # Windows sockets have no sendmsg
+                self.tcp_socket.sendall(b''.join(frames))
+    
+    def close_tcp(self):
+        """Shut the connection down so the server and our receiver see EOF at once"""
+        try:
+            self.tcp_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        # Short non-zero linger: close() waits at most 1 s for the flushed frames
+        # instead of resetting the connection and discarding them
+        try:
+            self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 1))
+        except OSError:
+            pass
+        self.tcp_socket.close()
+    
+    def run_cleanup(self, obj, *methods):
+        """Call obj's cleanup methods in order, ignoring failures"""
+        for name in methods:
+            with contextlib.suppress(Exception):
+                getattr(obj, name)()
+    
     def on_closing(self):
         """Handle window close - FIXED"""
+        if self.closing:
+            return
         if messagebox.askokcancel("Quit", "Exit IntraConnect?"):
+            self.closing = True
+            
+            # Tell peers our media stopped instead of leaving frozen tiles behind
+            if self.connected:
+                if self.video_on and self.video_stop_msg:
+                    self.pending_sends.append(self.video_stop_msg)
+                if self.screen_on:
+                    self.pending_sends.append(self.encode_message('SCREEN_STOP', {}))
+                if self.is_speaking and self.speaking_msgs:
+                    self.pending_sends.append(self.speaking_msgs[False])
             self.connected = False
             
             # Stop media
             self.video_on = False
             self.audio_on = False
             self.screen_on = False
+            self.screen_stop.set()
             
-            time.sleep(0.2)
-            
-            # Cleanup - FIXED: Use correct attribute names
-            if self.video_cap:
-                try:
-                    self.video_cap.release()
-                except:
-                    pass
-            
-            # FIXED: Changed from self.audio_in to self.audio_stream
-            if hasattr(self, 'audio_stream') and self.audio_stream:
-                try:
-                    self.audio_stream.stop()
-                    self.audio_stream.close()
-                except:
-                    pass
-            
-            # FIXED: Changed from self.audio_out to self.audio_out_stream
-            if hasattr(self, 'audio_out_stream') and self.audio_out_stream:
-                try:
-                    self.audio_out_stream.stop()
-                    self.audio_out_stream.close()
-                except:
-                    pass
-            
-            # FIXED: Removed self.audio.terminate() - sounddevice doesn't need this
-            
-            if self.screen_capturer:
-                try:
-                    self.screen_capturer.close()
-                except:
-                    pass
-            
-            if self.tcp_socket:
-                try:
-                    self.tcp_socket.close()
-                except:
-                    pass
-            
-            if self.udp_socket:
-                try:
-                    self.udp_socket.close()
-                except:
-                    pass
-            
-            self.root.destroy()
-
+            # Release devices off the Tk thread so the window keeps repainting meanwhile
+            threading.Thread(target=self.shutdown_worker, daemon=True).start()
+    
+    def shutdown_worker(self):
+        """Release media devices and sockets, then destroy the window on the Tk thread"""
+        # Give capture threads up to 0.2 s to notice the flags before their devices close
+        deadline = time.monotonic() + 0.2
+        for stopped in (self.video_stopped, self.screen_stopped):
+            stopped.wait(max(0.0, deadline - time.monotonic()))
+        
+        # Cleanup: each resource's release/close blocks in C with the GIL dropped,
+        # so run them side by side and wait for the slowest rather than the sum
+        targets = [
+            (self.video_cap, 'release'),
+            (self.audio_stream, 'stop', 'close'),
+            (self.audio_out_stream, 'stop', 'close'),
+            (self.udp_socket, 'close'),
+            (self.decode_pool, 'shutdown'),
+        ]
+        if self.tcp_socket:
+            # Farewell frames go out before the TCP socket closes; both live on self
+            targets.append((self, 'flush_pending_sends', 'close_tcp'))
+        cleanups = [target for target in targets if target[0]]
+        
+        if cleanups:
+            pool = ThreadPoolExecutor(max_workers=len(cleanups))
+            futures = [pool.submit(self.run_cleanup, *target) for target in cleanups]
+            wait(futures, timeout=1.0)
+            pool.shutdown(wait=False)
+        
+        self.post_ui(self.root.destroy)
 
 if __name__ == "__main__":
     print("="*70)
@@ -1243,19 +2217,14 @@ if __name__ == "__main__":
     print("="*70)
     print("\nINFO: Starting application...")
     
-    # Check dependencies
-    try:
-        import cv2
-        import sounddevice
-        import mss
-        import customtkinter
-        from PIL import Image
-        import numpy
-        print("✓ All dependencies found")
-    except ImportError as e:
-        print(f"ERROR: Missing dependency: {e}")
+    # Check dependencies without importing them a second time
+    required = ("cv2", "sounddevice", "mss", "customtkinter", "PIL", "numpy")
+    missing = [name for name in required if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"ERROR: Missing dependency: {', '.join(missing)}")
         print("Install with: pip install opencv-python sounddevice pillow numpy mss customtkinter")
-        exit(1)
+        sys.exit(1)
+    print("✓ All dependencies found")
     
     print("✓ Initializing GUI...")
     print("="*70 + "\n")
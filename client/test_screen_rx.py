@@ -0,0 +1,92 @@
+"""
+Screen share reassembly tests. The receive path is lifted out of client.py with ast,
+so they run without the GUI, OpenCV or NumPy installed:  python -m unittest discover client
+"""
+
+import ast
+import os
+import struct
+import types
+import unittest
+
+SCREEN_HEADER = struct.Struct('>HHH')
+METHODS = ('reset_screen_rx', 'receive_screen_chunk', 'handle_screen_start', 'handle_screen_stop')
+
+
+def load_receiver():
+    """Build a minimal client class holding just the screen receive methods"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client.py')
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    cls = next(n for n in tree.body if isinstance(n, ast.ClassDef) and n.name == 'IntraConnectClient')
+
+    decoded = []
+    frame = types.SimpleNamespace(shape=(600, 800, 3))
+    def jpeg_decode(data):
+        decoded.append(data)
+        return frame
+    namespace = {
+        'SCREEN_HEADER': SCREEN_HEADER,
+        'jpeg_decode': jpeg_decode,
+        'is_bgr8': lambda f: f is frame,
+        'cv2': types.SimpleNamespace(COLOR_BGR2RGB=4, cvtColor=lambda *a, **k: None),
+    }
+    receiver = type('Receiver', (), {})
+    for node in cls.body:
+        if isinstance(node, ast.FunctionDef) and node.name in METHODS:
+            exec(compile(ast.Module(body=[node], type_ignores=[]), path, 'exec'), namespace)
+            setattr(receiver, node.name, namespace[node.name])
+
+    client = receiver()
+    client.reset_screen_rx()
+    client.screen_popup_mapped = True
+    client.screen_popup_label = None
+    client.screen_bgr = client.screen_rgb = None
+    client.screen_ppm = b'P6'
+    client.post_ui = lambda fn, *args: fn(*args)
+    return client, decoded
+
+
+def send_frame(client, user, seq, payload=b'frame'):
+    """Deliver one frame as two chunks"""
+    client.receive_screen_chunk(user, SCREEN_HEADER.pack(seq, 2, 0) + payload[:2])
+    client.receive_screen_chunk(user, SCREEN_HEADER.pack(seq, 2, 1) + payload[2:])
+
+
+class ScreenReassemblyTest(unittest.TestCase):
+    def share(self, client, decoded, user, frames):
+        before = len(decoded)
+        for seq in range(1, frames + 1):
+            send_frame(client, user, seq)
+        return len(decoded) - before
+
+    def test_late_frame_dropped(self):
+        client, decoded = load_receiver()
+        send_frame(client, 'alice', 5)
+        send_frame(client, 'alice', 4)
+        self.assertEqual(len(decoded), 1)
+
+    def test_restart_after_stop(self):
+        client, decoded = load_receiver()
+        self.assertEqual(self.share(client, decoded, 'alice', 3000), 3000)
+        client.handle_screen_stop({})
+        client.handle_screen_start({'presenter': 'alice'})
+        self.assertEqual(self.share(client, decoded, 'alice', 10), 10)
+
+    def test_restart_without_stop(self):
+        # SCREEN_STOP lost or reordered behind the new share's start
+        client, decoded = load_receiver()
+        self.share(client, decoded, 'alice', 3000)
+        client.handle_screen_start({'presenter': 'alice'})
+        self.assertEqual(self.share(client, decoded, 'alice', 10), 10)
+
+    def test_new_presenter(self):
+        # Chunks from the next presenter may beat their SCREEN_START over TCP
+        client, decoded = load_receiver()
+        self.share(client, decoded, 'alice', 3000)
+        self.assertEqual(self.share(client, decoded, 'bob', 10), 10)
+        self.assertEqual(decoded[-1], b'frame')
+
+
+if __name__ == '__main__':
+    unittest.main()
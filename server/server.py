@@ -11,6 +11,21 @@ import time
 import os
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Length prefixes with this bit set carry a binary frame instead of JSON
+BINARY_FLAG = 0x80000000
+BIN_FILE_CHUNK = 1
+FILE_CHUNK_SIZE = 65536
+
+# Largest frames a client may announce; recv_exact allocates the whole body up front,
+# so anything bigger is a broken or hostile peer and ends the session
+MAX_JSON_FRAME = 4 * 1024 * 1024
+MAX_BINARY_FRAME = 3 + 0xFFFF + FILE_CHUNK_SIZE  # opcode, name length, name, one chunk
+
 
 class IntraConnectServer:
     def __init__(self, host='0.0.0.0', tcp_port=5555, udp_video_port=5556, udp_audio_port=5557):
@@ -29,6 +44,12 @@ class IntraConnectServer:
         self.udp_video_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_video_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.udp_video_socket.bind((self.host, self.udp_video_port))
+        # The relay fans every packet out to all clients; give it room for bursts
+        for option, value in ((socket.SO_RCVBUF, 8 * 1024 * 1024), (socket.SO_SNDBUF, 8 * 1024 * 1024)):
+            try:
+                self.udp_video_socket.setsockopt(socket.SOL_SOCKET, option, value)
+            except OSError:
+                pass
         
         # Client management
         # {username: {'tcp': socket, 'addr': (ip, port), 'udp_ip': str, 'udp_port': int}}
@@ -77,8 +98,10 @@ class IntraConnectServer:
         """Encode message with length prefix"""
         try:
             message = {'type': msg_type, 'data': data}
-            msg_json = json.dumps(message)
-            msg_bytes = msg_json.encode('utf-8')
+            if orjson:
+                msg_bytes = orjson.dumps(message)
+            else:
+                msg_bytes = json.dumps(message).encode('utf-8')
             length = struct.pack('>I', len(msg_bytes))
             return length + msg_bytes
         except Exception as e:
@@ -88,13 +111,43 @@ class IntraConnectServer:
     def decode_message(self, msg_bytes):
         """Decode message"""
         try:
-            msg_json = msg_bytes.decode('utf-8')
-            message = json.loads(msg_json)
+            if orjson:
+                message = orjson.loads(msg_bytes)
+            else:
+                message = json.loads(msg_bytes.decode('utf-8'))
             return message['type'], message['data']
         except Exception as e:
             print(f"[ERROR] Decode: {e}")
             return None, None
     
+    def encode_binary(self, opcode, filename, payload):
+        """Encode binary frame: opcode, filename and raw payload"""
+        name = filename.encode('utf-8')
+        body_len = 3 + len(name) + len(payload)
+        return struct.pack('>IBH', BINARY_FLAG | body_len, opcode, len(name)) + name + payload
+    
+    def decode_binary(self, msg_bytes):
+        """Decode binary frame"""
+        try:
+            opcode, name_len = struct.unpack_from('>BH', msg_bytes)
+            filename = bytes(msg_bytes[3:3 + name_len]).decode('utf-8')
+            return opcode, filename, memoryview(msg_bytes)[3 + name_len:]
+        except Exception as e:
+            print(f"[ERROR] Decode binary: {e}")
+            return None, None, None
+    
+    def recv_exact(self, sock, size):
+        """Read exactly size bytes into one preallocated buffer; None if the peer closed"""
+        buf = bytearray(size)
+        view = memoryview(buf)
+        got = 0
+        while got < size:
+            n = sock.recv_into(view[got:], size - got)
+            if not n:
+                return None
+            got += n
+        return buf
+    
     def broadcast_tcp(self, message, exclude_user=None):
         """Broadcast TCP message to all clients"""
         with self.client_lock:
@@ -117,12 +170,17 @@ class IntraConnectServer:
         username = None
         try:
             # Receive connection message
-            length_data = client_socket.recv(4)
+            length_data = self.recv_exact(client_socket, 4)
             if not length_data:
                 return
             
             msg_length = struct.unpack('>I', length_data)[0]
-            msg_data = client_socket.recv(msg_length)
+            if msg_length > MAX_JSON_FRAME:
+                print(f"[ERROR] {address[0]}: oversized CONNECT frame ({msg_length} bytes)")
+                return
+            msg_data = self.recv_exact(client_socket, msg_length)
+            if msg_data is None:
+                return
             msg_type, data = self.decode_message(msg_data)
             
             if msg_type == 'CONNECT':
@@ -151,19 +209,22 @@ class IntraConnectServer:
             
             # Main message loop
             while self.running:
-                length_data = client_socket.recv(4)
+                length_data = self.recv_exact(client_socket, 4)
                 if not length_data:
                     break
                 
                 msg_length = struct.unpack('>I', length_data)[0]
-                msg_data = b''
-                while len(msg_data) < msg_length:
-                    chunk = client_socket.recv(min(msg_length - len(msg_data), 4096))
-                    if not chunk:
-                        break
-                    msg_data += chunk
+                is_binary = msg_length & BINARY_FLAG
+                msg_length &= ~BINARY_FLAG
+                if msg_length > (MAX_BINARY_FRAME if is_binary else MAX_JSON_FRAME):
+                    print(f"[ERROR] Client {username}: oversized frame ({msg_length} bytes)")
+                    break
+                msg_data = self.recv_exact(client_socket, msg_length)
+                if msg_data is None:
+                    break
                 
-                if len(msg_data) != msg_length:
+                if is_binary:
+                    self.process_binary(*self.decode_binary(msg_data), username)
                     continue
                 
                 msg_type, data = self.decode_message(msg_data)
@@ -201,35 +262,14 @@ class IntraConnectServer:
             filename = data['filename']
             filesize = data['size']
             print(f"[FILE] {sender} uploading: {filename}")
-            self.files[filename] = {'data': b'', 'size': filesize, 'uploader': sender}
-        
-        elif msg_type == 'FILE_CHUNK':
-            filename = data['filename']
-            chunk = data['chunk'].encode('latin-1')
-            if filename in self.files:
-                self.files[filename]['data'] += chunk
-                if len(self.files[filename]['data']) >= self.files[filename]['size']:
-                    msg = self.encode_message('FILE_INFO', {
-                        'filename': filename,
-                        'size': self.files[filename]['size'],
-                        'uploader': self.files[filename]['uploader']
-                    })
-                    self.broadcast_tcp(msg, exclude_user=sender)
-                    print(f"[FILE] {filename} upload complete")
+            self.files[filename] = {'data': bytearray(), 'size': filesize, 'uploader': sender, 'complete': False}
+            if filesize == 0:
+                self.complete_upload(filename, sender)
         
         elif msg_type == 'FILE_REQUEST':
             filename = data['filename']
-            if filename in self.files:
-                with self.client_lock:
-                    if sender in self.clients:
-                        try:
-                            msg = self.encode_message('FILE_CHUNK', {
-                                'filename': filename,
-                                'chunk': self.files[filename]['data'].decode('latin-1')
-                            })
-                            self.clients[sender]['tcp'].sendall(msg)
-                        except Exception as e:
-                            print(f"[ERROR] File send: {e}")
+            if filename in self.files and self.files[filename]['complete']:
+                self.send_file(filename, sender)
         
         elif msg_type == 'SCREEN_START':
             self.presenter = sender
@@ -244,11 +284,6 @@ class IntraConnectServer:
                 msg = self.encode_message('SCREEN_STOP', {})
                 self.broadcast_tcp(msg)
         
-        elif msg_type == 'SCREEN_FRAME':
-            if self.presenter == sender:
-                msg = self.encode_message('SCREEN_FRAME', {'frame': data['frame']})
-                self.broadcast_tcp(msg, exclude_user=sender)
-        
         elif msg_type == 'VIDEO_FRAME':
             # Relay compressed video frame over TCP to all except sender
             try:
@@ -275,36 +310,89 @@ class IntraConnectServer:
             })
             self.broadcast_tcp(msg, exclude_user=sender)
     
+    def process_binary(self, opcode, filename, payload, sender):
+        """Process incoming binary frames"""
+        if opcode == BIN_FILE_CHUNK:
+            entry = self.files.get(filename)
+            if entry and entry['uploader'] == sender and not entry['complete']:
+                entry['data'] += payload
+                if len(entry['data']) >= entry['size']:
+                    self.complete_upload(filename, sender)
+    
+    def complete_upload(self, filename, sender):
+        """Announce a fully received file to everyone else"""
+        self.files[filename]['complete'] = True
+        msg = self.encode_message('FILE_INFO', {
+            'filename': filename,
+            'size': self.files[filename]['size'],
+            'uploader': self.files[filename]['uploader']
+        })
+        self.broadcast_tcp(msg, exclude_user=sender)
+        print(f"[FILE] {filename} upload complete")
+    
+    def send_file(self, filename, receiver):
+        """Stream a stored file to one client in fixed-size binary chunks"""
+        data = memoryview(self.files[filename]['data'])
+        start = self.encode_message('FILE_START', {'filename': filename, 'size': len(data)})
+        try:
+            with self.client_lock:
+                if receiver not in self.clients:
+                    return
+                self.clients[receiver]['tcp'].sendall(start)
+            for offset in range(0, len(data), FILE_CHUNK_SIZE):
+                chunk = self.encode_binary(BIN_FILE_CHUNK, filename, data[offset:offset + FILE_CHUNK_SIZE])
+                # Release the lock between chunks so broadcasts are not held up
+                with self.client_lock:
+                    if receiver not in self.clients:
+                        return
+                    self.clients[receiver]['tcp'].sendall(chunk)
+        except Exception as e:
+            print(f"[ERROR] File send: {e}")
+    
     def handle_udp_video(self):
         """Handle all UDP streams (video and audio)"""
         print("[UDP] Video handler started")
         while self.running:
             try:
                 data, addr = self.udp_video_socket.recvfrom(65536)
-                
-                # Extract username from packet
-                parts = data.split(b':', 2)
-                if len(parts) < 3:
+            except OSError:
+                continue
+            
+            try:
+                # Extract username from the header only; the payload is never scanned or sliced
+                i1 = data.find(b':')
+                i2 = data.find(b':', i1 + 1, 128) if i1 > 0 else -1
+                if i2 < 0:
                     continue
                 
-                username = parts[1].decode('utf-8')
+                username = data[i1 + 1:i2].decode('utf-8')
+                
+                # Only the current presenter's screen chunks are relayed
+                if data.startswith(b'SCREENFRAME:') and username != self.presenter:
+                    continue
                 
                 # Update sender IP but keep their announced UDP port
                 with self.client_lock:
-                    if username in self.clients:
-                        self.clients[username]['udp_ip'] = addr[0]
-                        
-                        fwd_count = 0
-                        for user, info in self.clients.items():
-                            if user != username and info.get('udp_port', 0) > 0:
-                                dest = (info.get('udp_ip', info['addr'][0]), info['udp_port'])
-                                try:
-                                    self.udp_video_socket.sendto(data, dest)
-                                    fwd_count += 1
-                                except:
-                                    pass
-            except:
-                pass
+                    if username not in self.clients:
+                        continue
+                    self.clients[username]['udp_ip'] = addr[0]
+                    dests = [
+                        (info.get('udp_ip', info['addr'][0]), info['udp_port'])
+                        for user, info in self.clients.items()
+                        if user != username and info.get('udp_port', 0) > 0
+                    ]
+                
+                self.forward_udp(data, dests)
+            except UnicodeDecodeError:
+                pass  # garbage username; drop the datagram
+    
+    def forward_udp(self, data, dests):
+        """Relay one media packet to every destination"""
+        for dest in dests:
+            try:
+                self.udp_video_socket.sendto(data, dest)
+            except (OSError, OverflowError):
+                pass  # one unreachable or bogus destination must not stop the rest
     
     def start(self):
         """Start the server"""
@@ -315,6 +403,7 @@ class IntraConnectServer:
         while self.running:
             try:
                 client_socket, address = self.tcp_socket.accept()
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 threading.Thread(target=self.handle_client, args=(client_socket, address), daemon=True).start()
             except Exception as e:
                 if self.running: